@@ -1,9 +1,20 @@
 import os
-import json
-import requests
+import re
+import httpx
+import atexit
+import orjson
+import bisect
+import hashlib
+import asyncio
+import argparse
 import datetime
+import itertools
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import dateutil.parser
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
 
 # --- 1. CONFIGURATION & SETUP (NEW SDK) ---
@@ -27,81 +38,290 @@ except Exception as e:
 # Constants
 SALES_API_ENDPOINT = "https://sandbox.mkonnekt.net/ch-portal/api/v1/orders/recent"
 CACHE_DURATION = datetime.timedelta(minutes=5)
-
-# In-memory cache
+BATCH_SIZE = 6  # queries per Gemini call in --queries-file mode
+ANALYSIS_WORKERS = 4  # analyses that may run in the background at once
+ANALYSIS_CACHE_SIZE = 128  # past answers kept for repeated questions
+MAX_RAW_ORDERS = 500  # above this, Gemini gets a local summary instead of raw orders
+
+# Console output is shared by the main thread and the background analysis threads.
+# A result block holds _print_lock while it prints (and streams); log lines from
+# any other thread are held back meanwhile and printed once the block closes.
+_print_lock = threading.Lock()
+_log_lock = threading.Lock()  # guards _block_owner and _held_back
+_block_owner = None
+_held_back = []
+# Set on Ctrl+C: running analyses stop reading their Gemini streams and go quiet
+_stop = threading.Event()
+
+
+def log(message: str = "", end: str = "\n"):
+    # Prints a line, or holds it back while another thread's result block is open.
+    with _log_lock:
+        if _stop.is_set():
+            # Shutting down: only the main thread still prints, and straight away
+            if threading.current_thread() is threading.main_thread():
+                print(message, end=end, flush=True)
+            return
+        if _block_owner is not None and _block_owner is not threading.current_thread():
+            _held_back.append(message + end)
+            return
+        print(message, end=end, flush=True)
+
+
+def _open_block():
+    global _block_owner
+    _print_lock.acquire()
+    with _log_lock:
+        _block_owner = threading.current_thread()
+
+
+def _close_block():
+    global _block_owner
+    with _log_lock:
+        _block_owner = None
+        if not _stop.is_set():
+            print("".join(_held_back), end="", flush=True)
+        _held_back.clear()
+    _print_lock.release()
+
+
+# Envelope keys the order list has been seen under, most likely first
+_ORDER_LIST_KEYS = ("data", "results", "orders")
+
+# In-memory cache, revalidated with the validators the API sent alongside the data
 _api_cache = {
     "data": None,
     "timestamp": None,
+    "etag": None,
+    "last_modified": None,
+    "days": None,
+    "by_date": None,
 }
 
+# Pooled HTTP/2 client so repeat fetches reuse the TCP/TLS connection
+_http = httpx.Client(http2=True, timeout=10.0, follow_redirects=True)
+atexit.register(_http.close)
+
 # --- 2. API CLIENT (with Caching & Validation) ---
 
+def _cached_or_none():
+    # Stale-if-error: a failed revalidation must not hide the good copy we already hold.
+    if _api_cache["data"] is not None:
+        log(f"[WARN] Using cached API data from {_api_cache['timestamp']:%H:%M:%S} instead.")
+        return _api_cache["data"]
+    return None
+
+
 def get_sales_data():
     #fetches sales data from the API with caching and response validation.
     global _api_cache
 
     now = datetime.datetime.now()
 
-    # Check if cache is valid
-    if _api_cache["data"] and _api_cache["timestamp"]:
-        if now - _api_cache["timestamp"] < CACHE_DURATION:
-            print("[INFO] Using cached API data.")
+    # Conditional-GET headers for the cached copy, if the API gave us validators
+    headers = {}
+    if _api_cache["data"] is not None:
+        if _api_cache["etag"]:
+            headers["If-None-Match"] = _api_cache["etag"]
+        if _api_cache["last_modified"]:
+            headers["If-Modified-Since"] = _api_cache["last_modified"]
+
+        # Without validators we cannot ask the API, so fall back to the time-based cache
+        if not headers and now - _api_cache["timestamp"] < CACHE_DURATION:
+            log("[INFO] Using cached API data.")
             return _api_cache["data"]
 
-    print("[INFO] Fetching new data from Sales API...")
+    log("[INFO] Fetching new data from Sales API...")
     try:
-        response = requests.get(SALES_API_ENDPOINT)
+        response = _http.get(SALES_API_ENDPOINT, headers=headers)
+        if response.status_code == 304:
+            # Unchanged upstream: skip the body and the JSON decode entirely
+            _api_cache["timestamp"] = now
+            log("[INFO] API data not modified, using cached API data.")
+            return _api_cache["data"]
         # Raise an error for bad responses (4xx or 5xx)
         response.raise_for_status() 
         
-        data = response.json()
+        data = orjson.loads(response.content)
         orders_list = None
         
         # Check if the response is a dictionary (as hypothesized)
         if isinstance(data, dict):
-            # Try to find the list inside common keys
-            if 'data' in data and isinstance(data.get('data'), list):
-                print("[INFO] Found order list inside 'data' key.")
-                orders_list = data['data']
-            elif 'results' in data and isinstance(data.get('results'), list):
-                print("[INFO] Found order list inside 'results' key.")
-                orders_list = data['results']
-            elif 'orders' in data and isinstance(data.get('orders'), list):
-                print("[INFO] Found order list inside 'orders' key.")
-                orders_list = data['orders']
-            else:
-                # The structure is a dict, but we don't know the key.
-                print(f"[ERROR] API returned a dictionary, but could not find the order list: {data}")
-                return None
+            # Try the known envelope keys first, in order; only if none holds a list,
+            # fall back to the first list-valued key, whatever the envelope calls it.
+            match = next(
+                ((key, data[key]) for key in _ORDER_LIST_KEYS if isinstance(data.get(key), list)),
+                None,
+            ) or next(((key, value) for key, value in data.items() if isinstance(value, list)), None)
+            if match is None:
+                # The structure is a dict, but none of its values is a list.
+                log(f"[ERROR] API returned a dictionary, but could not find the order list: {data}")
+                return _cached_or_none()
+            key, orders_list = match
+            log(f"[INFO] Found order list inside '{key}' key.")
         elif isinstance(data, list):
             # The API returned a list directly, as originally expected.
-            print("[INFO] API returned a list directly.")
+            log("[INFO] API returned a list directly.")
             orders_list = data
         else:
             # The API returned something else (e.g., a string)
-            print(f"[ERROR] API returned an unexpected response (not a list or dict): {data}")
-            return None
+            log(f"[ERROR] API returned an unexpected response (not a list or dict): {data}")
+            return _cached_or_none()
+
+        # Only completed orders are ever analyzed, so drop the rest before caching;
+        # every later query then walks (and keeps in memory) just the locked orders.
+        fetched_count = len(orders_list)
+        orders_list = [o for o in orders_list if isinstance(o, dict) and o.get("state") == "locked"]
 
         # Update cache with the *actual list*
         _api_cache["data"] = orders_list
+        _api_cache["days"], _api_cache["by_date"] = index_orders_by_date(orders_list)
         _api_cache["timestamp"] = now
-        print(f"[INFO] API data fetched and cached ({len(orders_list)} orders).")
+        _api_cache["etag"] = response.headers.get("ETag")
+        _api_cache["last_modified"] = response.headers.get("Last-Modified")
+        log(f"[INFO] API data fetched and cached ({len(orders_list)} of {fetched_count} orders are completed).")
         return orders_list
 
-    except requests.exceptions.RequestException as e:
-        print(f"[ERROR] API request failed: {e}")
-        return None
-    except json.JSONDecodeError:
-        print(f"[ERROR] Failed to decode API response as JSON.")
-        return None
+    except httpx.HTTPError as e:
+        log(f"[ERROR] API request failed: {e}")
+        return _cached_or_none()
+    except orjson.JSONDecodeError:
+        log(f"[ERROR] Failed to decode API response as JSON.")
+        return _cached_or_none()
 
 
 # --- 3. SMART DATE PARSING (NEW SDK) ---
 
+# Markdown code fence the model sometimes wraps its JSON in. Anchored to the ends
+# so fences inside JSON string values (e.g. markdown answers) are left intact.
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+def _date_examples(today: datetime.date) -> str:
+    # Few-shot examples shared by the single and batched date prompts.
+    return f"""
+    Examples:
+    - Query "yesterday": {{"start_date": "{today - datetime.timedelta(days=1)}", "end_date": "{today - datetime.timedelta(days=1)}"}}
+    - Query "today": {{"start_date": "{today}", "end_date": "{today}"}}
+    - Query "this month": {{"start_date": "{today.replace(day=1)}", "end_date": "{today}"}}
+    - Query "last week" (assume Mon-Sun): {{"start_date": "2025-10-27", "end_date": "2025-11-02"}}
+    - Query "how much revenue?": {{"start_date": "{today}", "end_date": "{today}"}} (Defaults to today)
+    """
+
+
+def _fast_iso(s: str) -> datetime.datetime:
+    # Slices the fixed 'YYYY-MM-DDTHH:MM:SS' shape without any format interpretation.
+    # index_orders_by_date keys API timestamps of this shape off their date prefix,
+    # so in practice this only runs for full timestamps returned via _parse_date.
+    return datetime.datetime(
+        int(s[0:4]), int(s[5:7]), int(s[8:10]),
+        int(s[11:13]), int(s[14:16]), int(s[17:19]),
+    )
+
+
+def _parse_iso(s: str) -> datetime.datetime:
+    # Parses an ISO 8601 timestamp, cheapest parser first:
+    # slice parser -> datetime.fromisoformat -> dateutil (~100x slower).
+    if len(s) == 19 and s[4] == "-" and s[7] == "-" and s[10] in "T ":
+        try:
+            return _fast_iso(s)
+        except ValueError:
+            pass
+    try:
+        return datetime.datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        return dateutil.parser.isoparse(s)
+
+
+def _parse_date(s: str) -> datetime.date:
+    # Parses a 'YYYY-MM-DD' string, tolerating full timestamps from the LLM.
+    try:
+        return datetime.date.fromisoformat(s)
+    except ValueError:
+        return _parse_iso(s).date()
+
+
+def _last_month(t: datetime.date) -> (datetime.date, datetime.date):
+    last_day = t.replace(day=1) - datetime.timedelta(days=1)
+    return last_day.replace(day=1), last_day
+
+
+# Fixed phrases that need no LLM round-trip; each maps today's date to (start, end)
+_QUICK_DATES = {
+    "today": lambda t: (t, t),
+    "yesterday": lambda t: (t - datetime.timedelta(days=1), t - datetime.timedelta(days=1)),
+    "this week": lambda t: (t - datetime.timedelta(days=t.weekday()), t),
+    "last week": lambda t: (
+        t - datetime.timedelta(days=t.weekday() + 7),
+        t - datetime.timedelta(days=t.weekday() + 1),
+    ),
+    "this month": lambda t: (t.replace(day=1), t),
+    "last month": _last_month,
+    "this year": lambda t: (t.replace(month=1, day=1), t),
+}
+_QUICK_DATES_RE = re.compile(r"\b(" + "|".join(_QUICK_DATES) + r")\b")
+_LAST_N_DAYS_RE = re.compile(r"\b(?:last|past) (\d{1,4}) days?\b")
+_ISO_RANGE_RE = re.compile(r"\b(?:from\s+)?(\d{4}-\d{2}-\d{2})\s*(?:to|-)\s*(\d{4}-\d{2}-\d{2})\b")
+_ISO_DATE_RE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+
+# Date wording the table above does not cover. If any is left once the known
+# phrases are removed, it changes their meaning ("since last month", "the day
+# before yesterday", "this year vs last year"), so the query goes to the LLM.
+_UNRESOLVED_DATE_RE = re.compile(
+    r"\b(?:since|before|after|until|till|through|thru|from|ago|vs|versus|compar\w*|between"
+    r"|days?|weeks?|weekends?|months?|years?|quarters?|q[1-4]|hours?"
+    r"|last|past|previous|prior|next|tomorrow|tonight|morning|afternoon|evening"
+    r"|jan|january|feb|february|mar|march|apr|april|may|jun|june|jul|july|aug|august"
+    r"|sep|sept|september|oct|october|nov|november|dec|december"
+    r"|mon|monday|tue|tues|tuesday|wed|wednesday|thu|thur|thurs|thursday"
+    r"|fri|friday|sat|saturday|sun|sunday|(?:19|20)\d{2})\b"
+)
+
+
+def _last_n_days(match, t: datetime.date) -> (datetime.date, datetime.date):
+    days = int(match.group(1))
+    if days < 1:
+        raise ValueError("empty 'last N days' window")
+    return t - datetime.timedelta(days=days - 1), t
+
+
+# Matched in order, each match removed from the query before the next pattern runs
+_QUICK_PATTERNS = [
+    (_ISO_RANGE_RE, lambda m, t: (datetime.date.fromisoformat(m.group(1)), datetime.date.fromisoformat(m.group(2)))),
+    (_QUICK_DATES_RE, lambda m, t: _QUICK_DATES[m.group(1)](t)),
+    (_LAST_N_DAYS_RE, _last_n_days),
+    (_ISO_DATE_RE, lambda m, t: (datetime.date.fromisoformat(m.group(0)),) * 2),
+]
+
+
+def _quick_date_range(user_query: str, today: datetime.date):
+    # Resolves common date phrases locally. Returns None, leaving the query to the
+    # LLM, unless it holds exactly one known phrase and no other date wording.
+    query = user_query.lower().strip()
+    ranges = set()
+    try:
+        for pattern, to_range in _QUICK_PATTERNS:
+            ranges.update(to_range(match, today) for match in pattern.finditer(query))
+            query = pattern.sub(" ", query)
+    except ValueError:
+        # e.g. an impossible date such as 2025-02-30
+        return None
+
+    if len(ranges) != 1 or _UNRESOLVED_DATE_RE.search(query):
+        return None
+    start_date, end_date = ranges.pop()
+    # "2025-10-05 to 2025-10-01" means the same window as the other way round
+    return (start_date, end_date) if start_date <= end_date else (end_date, start_date)
+
+
 def get_date_range_from_llm(client: genai.Client, user_query: str) -> (datetime.date, datetime.date):
-    print(f"[INFO] Parsing date for query: '{user_query}'")
+    log(f"[INFO] Parsing date for query: '{user_query}'")
     
     today = datetime.date.today()
+    quick = _quick_date_range(user_query, today)
+    if quick:
+        log(f"[INFO] Date range parsed locally: {quick[0]} to {quick[1]}")
+        return quick
+
     prompt = f"""
     You are a date parsing assistant. Today's date is {today.isoformat()}.
     Analyze the user's query and determine the start date and end date (inclusive) for their request.
@@ -110,14 +330,7 @@ def get_date_range_from_llm(client: genai.Client, user_query: str) -> (datetime.
 
     Respond ONLY with a JSON object in the format:
     {{"start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD"}}
-    
-    Examples:
-    - Query "yesterday": {{"start_date": "{today - datetime.timedelta(days=1)}", "end_date": "{today - datetime.timedelta(days=1)}"}}
-    - Query "today": {{"start_date": "{today}", "end_date": "{today}"}}
-    - Query "this month": {{"start_date": "{today.replace(day=1)}", "end_date": "{today}"}}
-    - Query "last week" (assume Mon-Sun): {{"start_date": "2025-10-27", "end_date": "2025-11-02"}}
-    - Query "how much revenue?": {{"start_date": "{today}", "end_date": "{today}"}} (Defaults to today)
-    """
+    {_date_examples(today)}"""
 
     try:
         response = client.models.generate_content(
@@ -126,62 +339,131 @@ def get_date_range_from_llm(client: genai.Client, user_query: str) -> (datetime.
         )
         
         # Clean up the response to get pure JSON
-        json_str = response.text.strip().replace("```json", "").replace("```", "")
-        dates = json.loads(json_str)
+        json_str = _FENCE_RE.sub("", response.text)
+        dates = orjson.loads(json_str)
         
-        start_date = dateutil.parser.isoparse(dates["start_date"]).date()
-        end_date = dateutil.parser.isoparse(dates["end_date"]).date()
+        start_date = _parse_date(dates["start_date"])
+        end_date = _parse_date(dates["end_date"])
         
-        print(f"[INFO] Date range parsed: {start_date} to {end_date}")
+        log(f"[INFO] Date range parsed: {start_date} to {end_date}")
         return start_date, end_date
         
     except Exception as e:
-        print(f"[ERROR] Failed to parse date with LLM: {e}. Defaulting to today.")
+        log(f"[ERROR] Failed to parse date with LLM: {e}. Defaulting to today.")
         today = datetime.date.today()
         return today, today
 
 
-# --- 4. DATA FILTERING ---
-def filter_orders_by_date(all_orders: list, start_date: datetime.date, end_date: datetime.date) -> list:
-    # Filters orders to only those completed within the date range.
-    print(f"[INFO] Filtering orders from {start_date} to {end_date}...")
-    filtered_orders = []
-    
-    # Create datetime objects for comparison (start of day, end of day)
-    start_dt = datetime.datetime.combine(start_date, datetime.time.min)
-    end_dt = datetime.datetime.combine(end_date, datetime.time.max)
+def get_date_ranges_from_llm(client: genai.Client, queries: list) -> list:
+    # Batched variant of get_date_range_from_llm: one Gemini call for many queries.
+    # Queries with a locally recognised date phrase never reach the LLM.
+    today = datetime.date.today()
+    results = [_quick_date_range(q, today) for q in queries]
+    misses = [i for i, r in enumerate(results) if r is None]
+    if not misses:
+        log(f"[INFO] Parsed dates for {len(queries)} queries locally.")
+        return results
 
-    if not all_orders:
-        return []
+    llm_ranges = _get_date_ranges_from_llm(client, [queries[i] for i in misses], today)
+    for i, date_range in zip(misses, llm_ranges):
+        results[i] = date_range
+    return results
+
+
+def _get_date_ranges_from_llm(client: genai.Client, queries: list, today: datetime.date) -> list:
+    log(f"[INFO] Parsing dates for {len(queries)} queries in one request...")
+
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(queries, start=1))
+    prompt = f"""
+    You are a date parsing assistant. Today's date is {today.isoformat()}.
+    For each numbered user query, determine the start date and end date (inclusive) for the request.
+
+    Queries:
+    {numbered}
 
+    Respond ONLY with a JSON array of {{"start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD"}}
+    objects, one per query, in the same order as the queries.
+    {_date_examples(today)}"""
+
+    try:
+        response = client.models.generate_content(
+            model='gemini-2.0-flash',
+            contents=prompt
+        )
+
+        json_str = _FENCE_RE.sub("", response.text)
+        ranges = orjson.loads(json_str)
+        if not isinstance(ranges, list) or len(ranges) != len(queries):
+            raise ValueError(f"expected {len(queries)} date ranges, got {ranges!r}")
+    except Exception as e:
+        log(f"[ERROR] Failed to parse dates with LLM: {e}. Defaulting to today.")
+        return [(today, today)] * len(queries)
+
+    results = []
+    for query, dates in zip(queries, ranges):
+        try:
+            results.append((_parse_date(dates["start_date"]), _parse_date(dates["end_date"])))
+        except Exception as e:
+            log(f"[ERROR] Bad date range for '{query}': {e}. Defaulting to today.")
+            results.append((today, today))
+    return results
+
+
+# --- 4. DATA FILTERING ---
+def index_orders_by_date(all_orders: list) -> (list, dict):
+    # Groups completed orders by their 'YYYY-MM-DD' creation day.
+    # Returns the sorted list of days alongside the day -> orders mapping.
+    by_date = {}
+    parse_iso = _parse_iso  # local lookup is cheaper inside the hot loop
     for order in all_orders:
         if order.get("state") == "locked":
             try:
-                # Parse the ISO 8601 timestamp
                 created_time_str = order.get("createdTime")
                 if not created_time_str:
+                    log(f"[WARN] Order {order.get('orderId')} has no createdTime, skipping it.")
                     continue
-                    
-                # The API timestamp has no timezone, so we parse it as naive
-                created_dt = dateutil.parser.isoparse(created_time_str)
-                
-                # Check if it's in the date range
-                if start_dt <= created_dt <= end_dt:
-                    filtered_orders.append(order)
+
+                # ISO timestamps start with their date, so the prefix is the day key
+                # for the API's format and only unusual shapes need a full parse.
+                day = created_time_str[:10]
+                if not (len(day) == 10 and day[4] == "-" and day[7] == "-"):
+                    day = parse_iso(created_time_str).date().isoformat()
+                by_date.setdefault(day, []).append(order)
             except Exception as e:
-                print(f"[WARN] Could not parse order {order.get('orderId')}: {e}")
-                
-    print(f"[INFO] Found {len(filtered_orders)} completed orders in date range.")
+                log(f"[WARN] Could not parse order {order.get('orderId')}: {e}")
+
+    # Keep each day's orders chronological so filtered windows come out in time order
+    for orders in by_date.values():
+        orders.sort(key=lambda o: o["createdTime"])
+    return sorted(by_date), by_date
+
+
+def filter_orders_by_date(all_orders: list, start_date: datetime.date, end_date: datetime.date) -> list:
+    # Filters orders to only those completed within the date range.
+    log(f"[INFO] Filtering orders from {start_date} to {end_date}...")
+
+    if not all_orders:
+        return []
+
+    # The cached list already has its index; anything else is indexed on the fly
+    if all_orders is _api_cache["data"] and _api_cache["by_date"] is not None:
+        days, by_date = _api_cache["days"], _api_cache["by_date"]
+    else:
+        days, by_date = index_orders_by_date(all_orders)
+
+    # ISO days sort lexicographically, so two bisects bound the window: O(log days + window)
+    lo = bisect.bisect_left(days, start_date.isoformat())
+    hi = bisect.bisect_right(days, end_date.isoformat())
+    filtered_orders = list(itertools.chain.from_iterable(by_date[day] for day in days[lo:hi]))
+
+    log(f"[INFO] Found {len(filtered_orders)} completed orders in date range.")
     return filtered_orders
 
 
 # --- 5. LLM ANALYSIS (NEW SDK) ---
 
-def get_analysis_from_gemini(client: genai.Client, user_query: str, orders: list):
-    print("[INFO] Sending data to Gemini for analysis...")
-
-    # This is the "System Prompt" that instructs the model
-    system_instruction = """
+# This is the "System Prompt" that instructs the model
+ANALYSIS_SYSTEM_INSTRUCTION = """
     You are a friendly and expert sales analysis assistant.
     You will be given a user's question and a list of sales orders in JSON format.
     Your task is to analyze the JSON data to answer the user's question.
@@ -194,75 +476,335 @@ def get_analysis_from_gemini(client: genai.Client, user_query: str, orders: list
     5.  If the question is about 'best-selling items', analyze the 'lineItems' across all orders.
     6.  If the JSON list is empty, inform the user you found no sales data for that period.
     7.  The 'state' field 'locked' means the order is completed. You will only receive locked orders.
+    8.  For large periods you may receive a pre-aggregated summary instead of raw orders. Answer from its figures.
     """
 
+
+def _project(order: dict) -> dict:
+    # Keeps only the order fields the analysis prompt relies on; every other
+    # key would just be extra input tokens for Gemini to prefill.
+    return {
+        "total": order.get("total"),
+        "createdTime": order.get("createdTime"),
+        "lineItems": [
+            {"name": li.get("name"), "price": li.get("price"), "quantity": li.get("quantity")}
+            for li in order.get("lineItems") or []
+        ],
+    }
+
+
+def _summarize(orders: list) -> dict:
+    # Pre-aggregates a large order list locally so the prompt stays small and
+    # bounded no matter how wide the date window is. Amounts stay in cents.
+    item_counts = Counter()
+    item_revenue = Counter()
+    by_day = {}
+    for order in orders:
+        day = by_day.setdefault(str(order.get("createdTime") or "")[:10], {"order_count": 0, "total_cents": 0})
+        day["order_count"] += 1
+        day["total_cents"] += order.get("total") or 0
+        for li in order.get("lineItems") or []:
+            # Weight by units sold, as the raw line items sent to Gemini would be;
+            # only a missing quantity defaults to 1, an explicit 0 counts as 0
+            quantity = li.get("quantity")
+            quantity = 1 if quantity is None else quantity
+            item_counts[li.get("name")] += quantity
+            item_revenue[li.get("name")] += (li.get("price") or 0) * quantity
+    return {
+        "order_count": len(orders),
+        "total_cents": sum(day["total_cents"] for day in by_day.values()),
+        "by_day": by_day,
+        "top_items_by_count": item_counts.most_common(20),
+        "top_items_by_revenue_cents": item_revenue.most_common(20),
+    }
+
+
+def _orders_for_prompt(orders: list) -> (str, bytes):
+    # Returns the prompt line introducing the order data, and the data as compact JSON.
+    if len(orders) > MAX_RAW_ORDERS:
+        return (
+            f"Here is a pre-aggregated summary of the {len(orders)} orders for the relevant period. Please analyze it:",
+            orjson.dumps(_summarize(orders)),
+        )
+    return (
+        "Here is the sales data for the relevant period. Please analyze it:",
+        orjson.dumps([_project(o) for o in orders]),
+    )
+
+
+# Gemini config for analysis calls. The system prompt is far below Gemini's
+# minimum size for explicit context caching, so it is sent as a system_instruction.
+ANALYSIS_CONFIG = types.GenerateContentConfig(system_instruction=ANALYSIS_SYSTEM_INSTRUCTION)
+
+
+# LRU of past answers keyed by (normalized question, digest of the data sent).
+# Shared by the background analysis threads, hence the lock.
+_analysis_cache = OrderedDict()
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_from_gemini(client: genai.Client, user_query: str, orders: list, on_chunk=None):
+    # Streams the answer from Gemini, handing each text chunk to on_chunk as it
+    # arrives, and returns the full text.
+    try:
+        data_intro, orders_json = _orders_for_prompt(orders)
+    except Exception as e:
+        # Malformed order data (e.g. a line item that is not an object)
+        log(f"[ERROR] Could not prepare sales data for analysis: {e}")
+        return "I'm sorry, I encountered an error while analyzing the sales data."
+
+    # The prompt is fully determined by the question and the order data, so the
+    # same pair always gets the same answer; a changed order set changes the digest.
+    cache_key = (user_query.lower().strip(), hashlib.blake2b(orders_json, digest_size=8).hexdigest())
+    with _analysis_cache_lock:
+        cached = _analysis_cache.get(cache_key)
+        if cached:
+            _analysis_cache.move_to_end(cache_key)
+    if cached:
+        log("[INFO] Using cached analysis.")
+        if on_chunk:
+            on_chunk(cached)
+        return cached
+
+    log("[INFO] Sending data to Gemini for analysis...")
+
     # Create the user prompt for the model
     prompt_to_llm = f"""
     User Question: "{user_query}"
 
-    Here is the sales data for the relevant period. Please analyze it:
-    {json.dumps(orders, indent=2)}
+    {data_intro}
+    {orders_json.decode()}
     """
     
+    if _stop.is_set():
+        return ""
+
     try:
-        response = client.models.generate_content(
+        chunks = []
+        stream = client.models.generate_content_stream(
             model="gemini-2.0-flash", 
-            contents=[system_instruction, prompt_to_llm] # Pass both as a list
+            contents=prompt_to_llm,
+            config=ANALYSIS_CONFIG,
         )
-        return response.text
+        for chunk in stream:
+            if _stop.is_set():
+                # Ctrl+C: drop the rest of the answer and close the connection
+                stream.close()
+                return ""
+            if chunk.text:
+                chunks.append(chunk.text)
+                if on_chunk:
+                    on_chunk(chunk.text)
+        analysis = "".join(chunks)
     except Exception as e:
-        print(f"[ERROR] Gemini analysis failed: {e}")
+        log(f"[ERROR] Gemini analysis failed: {e}")
         return "I'm sorry, I encountered an error while analyzing the sales data."
 
+    # Only successful, non-empty answers are cached
+    if analysis:
+        with _analysis_cache_lock:
+            _analysis_cache[cache_key] = analysis
+            if len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+                _analysis_cache.popitem(last=False)
+    return analysis
+
+
+def get_analyses_from_gemini(client: genai.Client, queries: list, orders_per_query: list) -> list:
+    # Batched variant of get_analysis_from_gemini: one Gemini call answers every query,
+    # each against its own filtered order list.
+    log(f"[INFO] Sending {len(queries)} questions to Gemini for analysis in one request...")
+
+    try:
+        sections = []
+        for i, (query, orders) in enumerate(zip(queries, orders_per_query), start=1):
+            data_intro, orders_json = _orders_for_prompt(orders)
+            sections.append(f"""
+    Question {i}: "{query}"
+    {data_intro}
+    {orders_json.decode()}
+    """)
+        sections = "\n".join(sections)
+        prompt_to_llm = f"""
+    You will receive {len(queries)} numbered questions, each with its own sales data.
+    Answer each question using only its own data.
+    Respond ONLY with a JSON array of {len(queries)} strings, one markdown answer per question, in order.
+    {sections}"""
+
+        response = client.models.generate_content(
+            model="gemini-2.0-flash",
+            contents=prompt_to_llm,
+            config=ANALYSIS_CONFIG,
+        )
+        json_str = _FENCE_RE.sub("", response.text)
+        analyses = orjson.loads(json_str)
+        if not isinstance(analyses, list) or len(analyses) != len(queries):
+            raise ValueError(f"expected a JSON array of {len(queries)} answers")
+        return [str(a) for a in analyses]
+    except Exception as e:
+        log(f"[ERROR] Gemini batch analysis failed: {e}")
+        return ["I'm sorry, I encountered an error while analyzing the sales data."] * len(queries)
+
 # --- 6. MAIN APPLICATION LOOP (NEW SDK) ---
 
+# Analyses run here so the prompt is free for the next question while Gemini works
+_pool = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="analysis")
+
+
+async def fetch_orders_and_date_range(client: genai.Client, user_query: str):
+    # The sales fetch and the date parse are independent network calls, so run
+    # them side by side: latency becomes max(api, llm) instead of api + llm.
+    return await asyncio.gather(
+        asyncio.to_thread(get_sales_data),
+        asyncio.to_thread(get_date_range_from_llm, client, user_query),
+    )
+
+
+def _print_analysis_header(user_query: str, start_date: datetime.date, end_date: datetime.date):
+    log(f"\nAnalysis for '{user_query}' ({start_date} to {end_date}):")
+    log("---")
+    log("Analysis Result:\n")
+
+
+def print_analysis(user_query: str, start_date: datetime.date, end_date: datetime.date, analysis: str):
+    # Presents one analysis result block.
+    _open_block()
+    try:
+        _print_analysis_header(user_query, start_date, end_date)
+        log(len(analysis) > 0 and analysis or "No analysis available.")
+        log("---\n")
+    finally:
+        _close_block()
+
+
+def stream_analysis(user_query: str, start_date: datetime.date, end_date: datetime.date, orders: list) -> str:
+    # Gets the analysis from Gemini and prints it into its result block token by token.
+    # The block is only opened once the first token arrives, so analyses running
+    # side by side still overlap their requests and just take turns printing.
+    started = False
+
+    def on_chunk(text):
+        nonlocal started
+        if not started:
+            _open_block()
+            started = True
+            _print_analysis_header(user_query, start_date, end_date)
+        log(text, end="")
+
+    try:
+        analysis = get_analysis_from_gemini(client, user_query, orders, on_chunk=on_chunk)
+    finally:
+        if started:
+            log("\n---\n")
+            _close_block()
+
+    if not started and not _stop.is_set():
+        # Nothing was streamed (e.g. the request failed): show the fallback message
+        print_analysis(user_query, start_date, end_date, analysis)
+    return analysis
+
+
+def _report_failure(future):
+    # Done-callback for background analyses: nobody waits on their futures, so
+    # an exception would otherwise vanish without the user seeing anything.
+    if not future.cancelled() and future.exception() is not None:
+        log(f"\n[ERROR] An unexpected error occurred: {future.exception()}")
+        log("Please try your query again.\n")
+
+
+def _answer_batch(all_orders: list, batch: list) -> list:
+    # Resolves dates, filters and analyzes one batch; returns (query, start, end, analysis) rows.
+    date_ranges = get_date_ranges_from_llm(client, batch)
+    orders_per_query = [
+        filter_orders_by_date(all_orders, start_date, end_date)
+        for start_date, end_date in date_ranges
+    ]
+    analyses = get_analyses_from_gemini(client, batch, orders_per_query)
+    return [
+        (user_query, start_date, end_date, analysis)
+        for user_query, (start_date, end_date), analysis in zip(batch, date_ranges, analyses)
+    ]
+
+
+def run_batch(queries: list):
+    # Answers a list of queries non-interactively, BATCH_SIZE queries per Gemini call.
+    # Batches run in parallel on the analysis pool; results print in query order.
+    all_orders = get_sales_data()
+    if all_orders is None:
+        log("I'm sorry, I couldn't retrieve valid sales data.")
+        return
+
+    futures = [
+        _pool.submit(_answer_batch, all_orders, queries[i:i + BATCH_SIZE])
+        for i in range(0, len(queries), BATCH_SIZE)
+    ]
+    for future in futures:
+        for row in future.result():
+            print_analysis(*row)
+
+
 def main():
     # Main function to run the CLI agent.
-    print("\n--- 🤖 Welcome to the Sales Insight Agent ---")
-    print("Ask me about your sales! (e.g., 'What were our best-selling items yesterday?')")
-    print("Type 'exit' to quit.\n")
+    parser = argparse.ArgumentParser(description="Sales Insight Agent")
+    parser.add_argument(
+        "--queries-file",
+        help="Answer the queries in this file (one per line) non-interactively, in batches.",
+    )
+    args = parser.parse_args()
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        run_batch(queries)
+        return
+
+    log("\n--- 🤖 Welcome to the Sales Insight Agent ---")
+    log("Ask me about your sales! (e.g., 'What were our best-selling items yesterday?')")
+    log("Type 'exit' to quit.\n")
     
     # The client is already initialized above
     global client
 
     while True:
         try:
-            user_query = input("> ")
+            # The prompt waits behind any answer that is still streaming
+            log("> ", end="")
+            user_query = input()
             if user_query.lower() in ["exit", "quit"]:
-                print("Goodbye!")
+                # Let analyses still in flight print before leaving
+                _pool.shutdown(wait=True)
+                log("Goodbye!")
                 break
 
-            print("[INFO] Processing your request...")
+            log("[INFO] Processing your request...")
             
-            # 1. Get all sales data (from cache or API)
-            all_orders = get_sales_data()
+            # 1 + 2. Get all sales data (from cache or API) and parse the date
+            # range from the query (pass the client), concurrently
+            all_orders, (start_date, end_date) = asyncio.run(
+                fetch_orders_and_date_range(client, user_query)
+            )
             if all_orders is None:
                 # This now catches both API failures and bad data responses
-                print("I'm sorry, I couldn't retrieve valid sales data.")
+                log("I'm sorry, I couldn't retrieve valid sales data.")
                 continue
 
-            # 2. Parse date range from query (pass the client)
-            start_date, end_date = get_date_range_from_llm(client, user_query)
-
             # 3. Filter orders based on date range and state
             filtered_orders = filter_orders_by_date(all_orders, start_date, end_date)
 
-            # 4. Get final analysis from LLM (pass the client)
-            analysis = get_analysis_from_gemini(client, user_query, filtered_orders)
-
-            # 5. Present result
-            print(f"\nAnalysis for '{user_query}' ({start_date} to {end_date}):")
-            print("---")
-            print("Analysis Result:\n")
-            print(len(analysis) > 0 and analysis or "No analysis available.")
-            print("---\n")
+            # 4. Get final analysis from LLM in the background,
+            # 5. and present the result as it streams in
+            future = _pool.submit(stream_analysis, user_query, start_date, end_date, filtered_orders)
+            future.add_done_callback(_report_failure)
+            log("[INFO] Analysis running in the background. You can ask your next question.")
 
         except KeyboardInterrupt:
-            print("\nGoodbye!")
+            # Cancel queued analyses and stop the running ones at their next chunk,
+            # so the process does not wait for in-flight streams before exiting
+            _stop.set()
+            _pool.shutdown(wait=False, cancel_futures=True)
+            log("\nGoodbye!")
             break
         except Exception as e:
-            print(f"\n[ERROR] An unexpected error occurred: {e}")
-            print("Please try your query again.\n")
+            log(f"\n[ERROR] An unexpected error occurred: {e}")
+            log("Please try your query again.\n")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+import types
+from collections import OrderedDict
+
+import pytest
+
+import run
+
+ORDERS = [{"orderId": "a", "state": "locked", "createdTime": "2025-11-02T13:45:12", "total": 906, "lineItems": []}]
+
+
+class FakeGemini:
+    # Stands in for the genai client: streams canned text chunks and records
+    # whether the stream was closed early.
+    def __init__(self, *texts, on_chunk_sent=None):
+        self.texts = texts
+        self.on_chunk_sent = on_chunk_sent
+        self.calls = 0
+        self.closed_early = False
+        self.models = types.SimpleNamespace(generate_content_stream=self._stream)
+
+    def _stream(self, **kwargs):
+        self.calls += 1
+        try:
+            for text in self.texts:
+                yield types.SimpleNamespace(text=text)
+                if self.on_chunk_sent:
+                    self.on_chunk_sent()
+        except GeneratorExit:
+            self.closed_early = True
+            raise
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(run, "_analysis_cache", OrderedDict())
+    monkeypatch.setattr(run, "_stop", run.threading.Event())
+
+
+def test_streams_chunks_and_caches_the_answer():
+    gemini = FakeGemini("Total ", "sales: $9.06")
+    received = []
+
+    assert run.get_analysis_from_gemini(gemini, "revenue?", ORDERS, on_chunk=received.append) == "Total sales: $9.06"
+    assert received == ["Total ", "sales: $9.06"]
+    # Same question about the same data is answered from the cache
+    assert run.get_analysis_from_gemini(gemini, "  Revenue? ", ORDERS) == "Total sales: $9.06"
+    assert gemini.calls == 1
+
+
+def test_stop_abandons_a_running_stream():
+    gemini = FakeGemini("one ", "two ", "three", on_chunk_sent=run._stop.set)
+    received = []
+
+    assert run.get_analysis_from_gemini(gemini, "revenue?", ORDERS, on_chunk=received.append) == ""
+    assert received == ["one "]
+    assert gemini.closed_early
+    assert not run._analysis_cache
+
+
+def test_stop_skips_analyses_that_have_not_started():
+    gemini = FakeGemini("never")
+    run._stop.set()
+
+    assert run.get_analysis_from_gemini(gemini, "revenue?", ORDERS) == ""
+    assert gemini.calls == 0
+
+
+def line(name, price, **extra):
+    return {"name": name, "price": price, **extra}
+
+
+def order(created, total, *items):
+    return {"createdTime": created, "total": total, "lineItems": list(items)}
+
+
+def test_summarize_weights_items_by_quantity():
+    summary = run._summarize([
+        order("2025-11-02T09:00:00", 1500, line("Latte", 500, quantity=3)),
+        order("2025-11-02T10:00:00", 700, line("Mocha", 700, quantity=1)),
+    ])
+
+    assert summary["top_items_by_count"] == [("Latte", 3), ("Mocha", 1)]
+    assert summary["top_items_by_revenue_cents"] == [("Latte", 1500), ("Mocha", 700)]
+
+
+@pytest.mark.parametrize(
+    "item, units, revenue",
+    [
+        (line("Latte", 500), 1, 500),                   # missing -> defaults to 1
+        (line("Latte", 500, quantity=None), 1, 500),    # null -> defaults to 1
+        (line("Latte", 500, quantity=0), 0, 0),         # explicit 0 stays 0
+        (line("Latte", None, quantity=2), 2, 0),        # missing price counts as 0
+    ],
+)
+def test_summarize_quantity_defaults(item, units, revenue):
+    summary = run._summarize([order("2025-11-02T09:00:00", 0, item)])
+
+    assert summary["top_items_by_count"] == [("Latte", units)]
+    assert summary["top_items_by_revenue_cents"] == [("Latte", revenue)]
+
+
+def test_summarize_totals_by_day():
+    summary = run._summarize([
+        order("2025-11-02T09:00:00", 1000),
+        order("2025-11-02T18:00:00", 250),
+        order("2025-11-03T08:00:00", 400),
+        order(None, 50),
+    ])
+
+    assert summary["order_count"] == 4
+    assert summary["total_cents"] == 1700
+    assert summary["by_day"] == {
+        "2025-11-02": {"order_count": 2, "total_cents": 1250},
+        "2025-11-03": {"order_count": 1, "total_cents": 400},
+        "": {"order_count": 1, "total_cents": 50},
+    }
+
+
+def test_summarize_ranks_count_and_revenue_separately():
+    summary = run._summarize([
+        order("2025-11-02T09:00:00", 0, line("Tea", 200, quantity=5), line("Cake", 900, quantity=2)),
+        order("2025-11-03T09:00:00", 0, line("Tea", 200, quantity=1)),
+    ])
+
+    assert summary["top_items_by_count"] == [("Tea", 6), ("Cake", 2)]
+    assert summary["top_items_by_revenue_cents"] == [("Cake", 1800), ("Tea", 1200)]
@@ -0,0 +1,92 @@
+import datetime
+
+import pytest
+
+import run
+
+D = datetime.date
+
+
+def order(order_id, created_time, state="locked"):
+    return {"orderId": order_id, "state": state, "createdTime": created_time}
+
+
+ORDERS = [
+    order("oct31-late", "2025-10-31T23:59:59"),
+    order("nov01-noon", "2025-11-01T12:00:00"),
+    order("nov01-early", "2025-11-01T00:00:00"),
+    order("nov02", "2025-11-02T09:30:00"),
+    order("nov03", "2025-11-03T00:00:01"),
+    order("nov01-open", "2025-11-01T10:00:00", state="open"),
+]
+
+
+def ids(orders):
+    return [o["orderId"] for o in orders]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(run, "_api_cache", {key: None for key in run._api_cache})
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    # Both bounds are inclusive whole days
+    (D(2025, 11, 1), D(2025, 11, 2), ["nov01-early", "nov01-noon", "nov02"]),
+    (D(2025, 11, 1), D(2025, 11, 1), ["nov01-early", "nov01-noon"]),
+    (D(2025, 10, 31), D(2025, 10, 31), ["oct31-late"]),
+    # Chronological order across days, whatever order the API sent
+    (D(2025, 1, 1), D(2025, 12, 31), ["oct31-late", "nov01-early", "nov01-noon", "nov02", "nov03"]),
+    # Reversed and empty windows
+    (D(2025, 11, 3), D(2025, 11, 1), []),
+    (D(2025, 12, 1), D(2025, 12, 31), []),
+])
+def test_filter_window(start, end, expected):
+    assert ids(run.filter_orders_by_date(ORDERS, start, end)) == expected
+
+
+def test_empty_order_list():
+    assert run.filter_orders_by_date([], D(2025, 11, 1), D(2025, 11, 1)) == []
+
+
+def test_uses_the_cached_index_only_for_the_cached_list(monkeypatch):
+    cached = [order("cached", "2025-11-01T08:00:00")]
+    # A deliberately different index, to tell which one the filter consulted
+    cache = dict(run._api_cache, data=cached, days=["2025-11-01"], by_date={"2025-11-01": [order("from-index", "x")]})
+    monkeypatch.setattr(run, "_api_cache", cache)
+
+    assert ids(run.filter_orders_by_date(cached, D(2025, 11, 1), D(2025, 11, 1))) == ["from-index"]
+    # Any other list is indexed on the fly
+    assert ids(run.filter_orders_by_date(ORDERS, D(2025, 11, 2), D(2025, 11, 2))) == ["nov02"]
+
+
+@pytest.mark.parametrize("created_time, day", [
+    # Timestamps with a zone are keyed by the calendar day as written
+    ("2025-11-02T13:00:00Z", "2025-11-02"),
+    ("2025-11-02T23:30:00-05:00", "2025-11-02"),
+    ("2025-11-02T00:15:00+09:00", "2025-11-02"),
+    # Shapes without a YYYY-MM-DD prefix go through the full parser
+    ("20251102T101010", "2025-11-02"),
+])
+def test_index_day_keys(created_time, day):
+    days, by_date = run.index_orders_by_date([order("x", created_time)])
+    assert days == [day]
+    assert ids(by_date[day]) == ["x"]
+
+
+@pytest.mark.parametrize("bad, warning", [
+    ({"orderId": "bad", "state": "locked"}, "[WARN] Order bad has no createdTime"),
+    (order("bad", ""), "[WARN] Order bad has no createdTime"),
+    (order("bad", 1730550000), "[WARN] Could not parse order bad"),
+    (order("bad", "garbage"), "[WARN] Could not parse order bad"),
+])
+def test_bad_created_time_is_skipped_with_a_warning(capsys, bad, warning):
+    days, by_date = run.index_orders_by_date([bad, order("ok", "2025-11-02T10:00:00")])
+
+    assert days == ["2025-11-02"]
+    assert ids(by_date["2025-11-02"]) == ["ok"]
+    assert warning in capsys.readouterr().out
+
+
+def test_non_locked_orders_are_not_indexed():
+    assert run.index_orders_by_date([order("open", "2025-11-02T10:00:00", state="open")]) == ([], {})
@@ -0,0 +1,42 @@
+import datetime
+
+import pytest
+
+from run import _quick_date_range
+
+TODAY = datetime.date(2026, 10, 14)  # a Wednesday
+D = datetime.date
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("What were our best-selling items yesterday?", (D(2026, 10, 13), D(2026, 10, 13))),
+    ("top 5 products today", (TODAY, TODAY)),
+    ("revenue this week", (D(2026, 10, 12), TODAY)),
+    ("last week", (D(2026, 10, 5), D(2026, 10, 11))),
+    ("revenue this month", (D(2026, 10, 1), TODAY)),
+    ("sales last month", (D(2026, 9, 1), D(2026, 9, 30))),
+    ("last 7 days revenue", (D(2026, 10, 8), TODAY)),
+    ("sales on 2025-11-02", (D(2025, 11, 2), D(2025, 11, 2))),
+    ("from 2025-10-01 to 2025-10-05", (D(2025, 10, 1), D(2025, 10, 5))),
+    ("2025-10-05 to 2025-10-01", (D(2025, 10, 1), D(2025, 10, 5))),
+])
+def test_resolves_known_phrases(query, expected):
+    assert _quick_date_range(query, TODAY) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "how much revenue?",
+    "today vs yesterday",
+    "sales the day before yesterday",
+    "revenue since 2025-10-01",
+    "sales before 2025-10-01",
+    "sales from 2025-10-01",
+    "this year vs last year",
+    "sales since last month",
+    "sales in the last week of september",
+    "sales 3 days ago",
+    "last 0 days",
+    "sales on 2025-02-30",
+])
+def test_leaves_other_queries_to_the_llm(query):
+    assert _quick_date_range(query, TODAY) is None
@@ -0,0 +1,95 @@
+import httpx
+import orjson
+import pytest
+
+import run
+
+LOCKED = {"orderId": "a", "state": "locked", "createdTime": "2025-11-02T13:45:12"}
+
+
+class FakeClient:
+    # Stands in for run._http: replays canned responses (or raises canned errors)
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent_headers = []
+
+    def get(self, url, headers=None):
+        self.sent_headers.append(headers)
+        result = self.responses.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def response(status, body=None, headers=None):
+    return httpx.Response(
+        status,
+        content=orjson.dumps(body) if body is not None else b"",
+        headers=headers,
+        request=httpx.Request("GET", run.SALES_API_ENDPOINT),
+    )
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(run, "_api_cache", {key: None for key in run._api_cache})
+
+
+def use_client(monkeypatch, *responses):
+    client = FakeClient(*responses)
+    monkeypatch.setattr(run, "_http", client)
+    return client
+
+
+def test_revalidates_with_etag_and_reuses_cache_on_304(monkeypatch):
+    client = use_client(monkeypatch, response(200, {"data": [LOCKED]}, {"ETag": '"v1"'}), response(304))
+
+    first = run.get_sales_data()
+    assert run.get_sales_data() is first
+    assert client.sent_headers[1] == {"If-None-Match": '"v1"'}
+
+
+@pytest.mark.parametrize("failure", [
+    response(500),
+    httpx.ReadTimeout("timed out"),
+    httpx.Response(200, content=b"not json", request=httpx.Request("GET", run.SALES_API_ENDPOINT)),
+])
+def test_failed_revalidation_serves_the_cached_copy(monkeypatch, capsys, failure):
+    use_client(monkeypatch, response(200, {"data": [LOCKED]}, {"ETag": '"v1"'}), failure)
+
+    first = run.get_sales_data()
+    assert run.get_sales_data() is first
+    assert "[WARN] Using cached API data" in capsys.readouterr().out
+
+
+def test_failure_without_cache_returns_none(monkeypatch):
+    use_client(monkeypatch, response(500))
+
+    assert run.get_sales_data() is None
+
+
+@pytest.mark.parametrize("body, key, expected", [
+    # Known keys win over any earlier list, in data > results > orders order
+    ({"errors": [], "data": [LOCKED]}, "data", [LOCKED]),
+    ({"orders": [], "results": [LOCKED]}, "results", [LOCKED]),
+    ({"orders": [LOCKED], "data": []}, "data", []),
+    # Unknown envelopes fall back to the first list-valued key
+    ({"meta": {"page": 1}, "items": [LOCKED]}, "items", [LOCKED]),
+])
+def test_order_list_envelope_priority(monkeypatch, capsys, body, key, expected):
+    use_client(monkeypatch, response(200, body))
+
+    assert run.get_sales_data() == expected
+    assert f"Found order list inside '{key}' key." in capsys.readouterr().out
+
+
+def test_bare_list_is_the_order_list(monkeypatch):
+    use_client(monkeypatch, response(200, [LOCKED, dict(LOCKED, state="open")]))
+
+    assert run.get_sales_data() == [LOCKED]
+
+
+def test_dict_without_a_list_is_rejected(monkeypatch):
+    use_client(monkeypatch, response(200, {"error": "nope"}))
+
+    assert run.get_sales_data() is None